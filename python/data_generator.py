@@ -16,177 +16,286 @@ Projet  : Analyse Factorielle Multivariée – Marché Boursier Marocain
 import numpy as np
 import pandas as pd
 import os
+from typing import Optional
+
+try:  # pyarrow est optionnel : repli sur pandas pour l'écriture CSV
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
 
 # ─── Reproductibilité ───────────────────────────────────────────────────────
-np.random.seed(42)
+GRAINE = 42
+
+# Valeurs arrondies à 2 décimales : float32 suffit et divise la mémoire par 2
+DTYPE = np.float32
 
 # ─── Chemins ─────────────────────────────────────────────────────────────────
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 RAW_DIR = os.path.join(PROJECT_ROOT, "data", "raw")
 
 
+# =============================================================================
+#  0. Flux aléatoires et axes temporels communs
+# =============================================================================
+def _generateurs(graine: int = GRAINE) -> list:
+    """
+    Crée deux générateurs PCG64 indépendants (macro, bourse) dérivés d'une
+    même graine via ``SeedSequence.spawn`` : chaque flux est reproductible
+    quel que soit l'ordre d'appel des deux générateurs.
+    """
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(graine).spawn(2)]
+
+
+def _axes_communs(n_mois: int = 180) -> tuple:
+    """
+    Construit une seule fois les dates et composantes communes aux deux
+    générateurs : (dates, tendance linéaire 0→1, cycle sinusoïdal).
+    """
+    dates = pd.date_range(start="2010-01-01", periods=n_mois, freq="MS")
+    trend = np.linspace(0, 1, n_mois, dtype=DTYPE)
+    cycle = np.sin(np.linspace(0, 15 * 2 * np.pi, n_mois, dtype=DTYPE)) * 0.1
+    return dates, trend, cycle
+
+
+def _resoudre_axes(n_mois: Optional[int], axes: Optional[tuple]) -> tuple:
+    """
+    Axes fournis, ou calculés sur ``n_mois`` (180 par défaut).
+
+    Lève ``ValueError`` si ``n_mois`` est donné et contredit la longueur
+    des axes fournis.
+    """
+    if axes is None:
+        return _axes_communs(180 if n_mois is None else n_mois)
+    if n_mois is not None and n_mois != len(axes[0]):
+        raise ValueError(
+            f"n_mois={n_mois} incompatible avec les axes fournis ({len(axes[0])} mois)")
+    return axes
+
+
 # =============================================================================
 #  1. Indicateurs Macroéconomiques
 # =============================================================================
-def generer_donnees_macro(n_mois: int = 180) -> pd.DataFrame:
+def generer_donnees_macro(n_mois: Optional[int] = None, axes: Optional[tuple] = None,
+                          rng: Optional[np.random.Generator] = None) -> pd.DataFrame:
     """
     Génère 9 indicateurs macroéconomiques mensuels pour le Maroc.
 
     Paramètres
     ----------
-    n_mois : int
-        Nombre d'observations mensuelles (180 = 15 ans : 2010-2024).
+    n_mois : int, optionnel
+        Nombre d'observations mensuelles (180 = 15 ans : 2010-2024) ; déduit
+        de ``axes`` si absent, doit concorder avec eux sinon.
+    axes : tuple, optionnel
+        (dates, trend, cycle) issus de ``_axes_communs`` ; recalculés si absents.
+    rng : np.random.Generator, optionnel
+        Flux aléatoire ; par défaut le flux « macro » issu de ``_generateurs()``.
 
     Retourne
     --------
     pd.DataFrame
         DataFrame avec les indicateurs macro et une colonne Date.
     """
-    dates = pd.date_range(start="2010-01-01", periods=n_mois, freq="MS")
-
     # ── composantes communes ──
-    trend = np.linspace(0, 1, n_mois)
-    cycle = np.sin(np.linspace(0, 15 * 2 * np.pi, n_mois)) * 0.1
-
-    # 1. PIB – Croissance (%) : fourchette typique 1-7 %
-    pib = 3.5 + trend * 0.5 + cycle + np.random.normal(0, 0.8, n_mois)
-    pib = np.clip(pib, -2, 7)
-
-    # 2. Inflation IPC (%) : fourchette 0.5-3.5 %
-    inflation = 1.5 + trend * 0.3 + np.random.normal(0, 0.5, n_mois)
-    inflation = np.clip(inflation, 0, 5)
-
-    # 3. Taux directeur BAM (%) : 1.5-3.25 %
-    taux_dir = 2.5 - trend * 0.5 + np.random.normal(0, 0.2, n_mois)
-    taux_dir = np.clip(taux_dir, 1.5, 4)
-
-    # 4. Taux de change MAD/USD : 8.5-10.5
-    taux_change = 9.0 + trend * 0.5 + np.random.normal(0, 0.3, n_mois)
-    taux_change = np.clip(taux_change, 8, 11)
-
-    # 5. Taux de chômage (%) : 8-13 %
-    chomage = 10.0 - trend * 1.5 + cycle * 0.5 + np.random.normal(0, 0.5, n_mois)
-    chomage = np.clip(chomage, 7, 14)
-
-    # 6. Balance commerciale (Mrd MAD) : typiquement négative
-    balance = -15 + trend * 2 + cycle * 2 + np.random.normal(0, 2, n_mois)
-
-    # 7. Réserves de change (Mrd USD) : 20-38
-    reserves = 25 + trend * 8 + np.random.normal(0, 1.5, n_mois)
-    reserves = np.clip(reserves, 18, 40)
-
-    # 8. Indice de production industrielle (base 100)
-    prod_ind = 100 + trend * 25 + cycle * 5 + np.random.normal(0, 3, n_mois)
-
-    # 9. Indice de confiance des ménages (50-150)
-    confiance = 100 + trend * 10 - cycle * 8 + np.random.normal(0, 5, n_mois)
-    confiance = np.clip(confiance, 60, 140)
-
-    return pd.DataFrame({
-        "Date":                dates,
-        "PIB_Croissance":      np.round(pib, 2),
-        "Inflation":           np.round(inflation, 2),
-        "Taux_Directeur":      np.round(taux_dir, 2),
-        "Taux_Change":         np.round(taux_change, 2),
-        "Chomage":             np.round(chomage, 2),
-        "Balance_Commerciale": np.round(balance, 2),
-        "Reserves_Change":     np.round(reserves, 2),
-        "Prod_Industrielle":   np.round(prod_ind, 2),
-        "Confiance_Menages":   np.round(confiance, 2),
-    })
+    dates, trend, cycle = _resoudre_axes(n_mois, axes)
+    n_mois = len(dates)
+    if rng is None:
+        rng = _generateurs()[0]
+
+    # ── paramètres : moyenne, tendance, cycle, écart-type du bruit, bornes ──
+    params = {
+        # 1. PIB – Croissance (%) : fourchette typique 1-7 %
+        "PIB_Croissance":      (3.5,   0.5,  1.0, 0.8, (-2, 7)),
+        # 2. Inflation IPC (%) : fourchette 0.5-3.5 %
+        "Inflation":           (1.5,   0.3,  0.0, 0.5, (0, 5)),
+        # 3. Taux directeur BAM (%) : 1.5-3.25 %
+        "Taux_Directeur":      (2.5,  -0.5,  0.0, 0.2, (1.5, 4)),
+        # 4. Taux de change MAD/USD : 8.5-10.5
+        "Taux_Change":         (9.0,   0.5,  0.0, 0.3, (8, 11)),
+        # 5. Taux de chômage (%) : 8-13 %
+        "Chomage":             (10.0, -1.5,  0.5, 0.5, (7, 14)),
+        # 6. Balance commerciale (Mrd MAD) : typiquement négative
+        "Balance_Commerciale": (-15,   2,    2,   2.0, (-np.inf, np.inf)),
+        # 7. Réserves de change (Mrd USD) : 20-38
+        "Reserves_Change":     (25,    8,    0,   1.5, (18, 40)),
+        # 8. Indice de production industrielle (base 100)
+        "Prod_Industrielle":   (100,   25,   5,   3.0, (-np.inf, np.inf)),
+        # 9. Indice de confiance des ménages (50-150)
+        "Confiance_Menages":   (100,   10,  -8,   5.0, (60, 140)),
+    }
+    coef = np.array([p[:4] for p in params.values()], dtype=DTYPE).T   # (4, K)
+    moyenne, sigma = coef[0], coef[3]
+    bornes = np.array([p[4] for p in params.values()], dtype=DTYPE)     # (K, 2)
+
+    # signal = [tendance, cycle] (n, 2) @ coefficients (2, K)
+    facteurs = np.column_stack([trend, cycle])
+    valeurs = facteurs @ coef[1:3]
+
+    # un seul tirage (n_mois, 9) mis à l'échelle par colonne
+    valeurs += moyenne
+    valeurs += rng.standard_normal((n_mois, len(params)), dtype=DTYPE) * sigma
+    np.clip(valeurs, bornes[:, 0], bornes[:, 1], out=valeurs)
+
+    df = pd.DataFrame(np.round(valeurs, 2), columns=list(params))
+    df.insert(0, "Date", dates)
+    return df
 
 
 # =============================================================================
 #  2. Indicateurs Boursiers
 # =============================================================================
-def generer_donnees_bourse(n_mois: int = 180) -> pd.DataFrame:
+def generer_donnees_bourse(n_mois: Optional[int] = None, axes: Optional[tuple] = None,
+                           rng: Optional[np.random.Generator] = None) -> pd.DataFrame:
     """
     Génère 12 indicateurs du marché boursier marocain (MASI).
 
     Paramètres
     ----------
-    n_mois : int
-        Nombre d'observations mensuelles.
+    n_mois : int, optionnel
+        Nombre d'observations mensuelles ; déduit de ``axes`` si absent.
+    axes : tuple, optionnel
+        (dates, trend, cycle) issus de ``_axes_communs`` ; recalculés si absents.
+    rng : np.random.Generator, optionnel
+        Flux aléatoire ; par défaut le flux « bourse » issu de ``_generateurs()``.
 
     Retourne
     --------
     pd.DataFrame
         DataFrame avec les indicateurs boursiers.
     """
-    dates = pd.date_range(start="2010-01-01", periods=n_mois, freq="MS")
-    trend = np.linspace(0, 1, n_mois)
-
-    # 10. MASI – niveau (~10 000)
-    masi = 10000 + trend * 4000 + np.cumsum(np.random.normal(0, 150, n_mois))
-    masi = np.clip(masi, 8000, 16000)
-
-    # 11. Rendement mensuel (%)
-    rendement = np.diff(masi) / masi[:-1] * 100
-    rendement = np.insert(rendement, 0, 0)
+    dates, trend, _ = _resoudre_axes(n_mois, axes)
+    n_mois = len(dates)
+    if rng is None:
+        rng = _generateurs()[1]
+
+    # ── tirages groupés : 8 colonnes gaussiennes, 2 exponentielles ──
+    #    log-rend. MASI  Capi  PER  DivY  Banque Telecom Indust Immo
+    sigma = np.array([0.0125, 30, 2, 0.3, 8, 6, 7, 10], dtype=DTYPE)
+    bruit = rng.standard_normal((n_mois, len(sigma)), dtype=DTYPE) * sigma
+    bruit_exp = rng.standard_exponential((n_mois, 2), dtype=DTYPE) \
+                * np.array([100, 3], dtype=DTYPE)
+
+    # 10. MASI – niveau (~10 000) : marche aléatoire sur les log-rendements,
+    #     dérive calibrée pour atteindre ~14 000 en fin de période
+    log_rend = bruit[:, 0]
+    log_rend += np.log(1.4) / n_mois
+    masi_brut = 10000 * np.exp(np.cumsum(log_rend))
+    masi = np.clip(masi_brut, 8000, 16000)
+
+    # 11. Rendement mensuel (%) : directement à partir des log-rendements,
+    #     sauf les mois touchant une borne (ou la quittant), recalculés sur
+    #     le niveau borné – rendement nul quand l'indice reste plafonné
+    rendement = np.expm1(log_rend) * 100
+    borne = masi != masi_brut
+    borne[1:] |= borne[:-1].copy()
+    precedent = np.empty_like(masi)
+    precedent[0] = 10000
+    precedent[1:] = masi[:-1]
+    rendement[borne] = (masi[borne] / precedent[borne] - 1) * 100
 
     # 12. Volume d'échange (M MAD)
-    volume = 500 + trend * 300 + np.abs(rendement) * 20 \
-             + np.random.exponential(100, n_mois)
+    volume = 500 + trend * 300 + np.abs(rendement) * 20 + bruit_exp[:, 0]
 
     # 13. Volatilité annualisée (%)
-    volatilite = 15 + np.abs(rendement) * 0.5 + np.random.exponential(3, n_mois)
+    volatilite = 15 + np.abs(rendement) * 0.5 + bruit_exp[:, 1]
     volatilite = np.clip(volatilite, 8, 40)
 
-    # 14. Capitalisation boursière (Mrd MAD)
-    capitalisation = 450 + trend * 200 + np.random.normal(0, 30, n_mois)
-    capitalisation = np.clip(capitalisation, 350, 750)
-
     # 15. Nombre de sociétés cotées
-    societes = 75 + np.floor(trend * 10).astype(int) \
-               + np.random.randint(-2, 3, n_mois)
-
-    # 16. Price-to-Earnings Ratio (PER)
-    per = 18 + trend * 3 + np.random.normal(0, 2, n_mois)
-    per = np.clip(per, 12, 28)
-
-    # 17. Rendement de dividende (%)
-    div_yield = 3.5 - trend * 0.5 + np.random.normal(0, 0.3, n_mois)
-    div_yield = np.clip(div_yield, 2, 5)
-
-    # 18-21. Indices sectoriels (base 100)
-    sect_banque  = 100 + trend * 30 + np.random.normal(0, 8, n_mois)
-    sect_telecom = 100 + trend * 15 + np.random.normal(0, 6, n_mois)
-    sect_indust  = 100 + trend * 25 + np.random.normal(0, 7, n_mois)
-    sect_immo    = 100 + trend * 20 + np.random.normal(0, 10, n_mois)
-
-    return pd.DataFrame({
-        "Date":            dates,
-        "MASI_Indice":     np.round(masi, 2),
-        "MASI_Rendement":  np.round(rendement, 2),
-        "Volume_Echange":  np.round(volume, 2),
-        "Volatilite":      np.round(volatilite, 2),
-        "Capitalisation":  np.round(capitalisation, 2),
-        "Societes_Cotees": societes,
-        "PER":             np.round(per, 2),
-        "Div_Yield":       np.round(div_yield, 2),
-        "Sect_Bancaire":   np.round(sect_banque, 2),
-        "Sect_Telecoms":   np.round(sect_telecom, 2),
-        "Sect_Industrie":  np.round(sect_indust, 2),
-        "Sect_Immobilier": np.round(sect_immo, 2),
-    })
+    societes = 75 + (trend * 10).astype(np.int16)  # trend ≥ 0 : troncature = plancher
+    societes += rng.integers(-2, 3, n_mois, dtype=np.int16)
+
+    # 14, 16-21. Indicateurs linéaires : moyenne + tendance + bruit
+    #   Capitalisation (Mrd MAD), PER, rendement de dividende (%),
+    #   indices sectoriels (base 100)
+    moyenne = np.array([450, 18, 3.5, 100, 100, 100, 100], dtype=DTYPE)
+    pente   = np.array([200, 3, -0.5, 30, 15, 25, 20], dtype=DTYPE)
+    basses  = np.array([350, 12, 2, -np.inf, -np.inf, -np.inf, -np.inf], dtype=DTYPE)
+    hautes  = np.array([750, 28, 5, np.inf, np.inf, np.inf, np.inf], dtype=DTYPE)
+    lineaires = trend[:, None] @ pente[None, :]
+    lineaires += moyenne
+    lineaires += bruit[:, 1:]
+    np.clip(lineaires, basses, hautes, out=lineaires)
+
+    # ── assemblage (n, 11) et arrondi en une seule passe ──
+    out = np.column_stack([masi, rendement, volume, volatilite, lineaires])
+    np.round(out, 2, out=out)
+    df = pd.DataFrame(out, columns=[
+        "MASI_Indice", "MASI_Rendement", "Volume_Echange", "Volatilite",
+        "Capitalisation", "PER", "Div_Yield",
+        "Sect_Bancaire", "Sect_Telecoms", "Sect_Industrie", "Sect_Immobilier",
+    ])
+    df.insert(0, "Date", dates)
+    df.insert(6, "Societes_Cotees", societes)
+    return df
 
 
 # =============================================================================
 #  3. Fusion et sauvegarde
 # =============================================================================
 def fusionner(macro: pd.DataFrame, bourse: pd.DataFrame) -> pd.DataFrame:
-    """Fusionne les deux datasets sur la colonne Date."""
+    """
+    Fusionne les deux datasets sur la colonne Date.
+
+    Lorsque les dates sont identiques (cas des générateurs partageant les
+    mêmes axes), une simple concaténation évite le tri et le hachage du merge.
+    """
+    if macro["Date"].equals(bourse["Date"]):
+        return pd.concat([macro, bourse.iloc[:, 1:]], axis=1)
     return pd.merge(macro, bourse, on="Date", how="inner")
 
 
-def sauvegarder(df: pd.DataFrame, nom: str, dossier: str):
-    """Sauvegarde en CSV et Excel."""
+def ecrire_csv(df: pd.DataFrame, path: str):
+    """
+    Écrit le DataFrame en CSV avec le writer C++ de pyarrow si disponible,
+    sinon avec ``DataFrame.to_csv``.
+    """
+    if pa is None:
+        df.to_csv(path, index=False)
+        return
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if "Date" in table.column_names:  # dates sans heure, comme pandas
+        i = table.column_names.index("Date")
+        table = table.set_column(i, "Date", table["Date"].cast(pa.date32()))
+    pacsv.write_csv(table, path,
+                    write_options=pacsv.WriteOptions(include_header=True))
+
+
+def ecrire_excel(df: pd.DataFrame, path: str):
+    """
+    Écrit le DataFrame en .xlsx via un classeur openpyxl en écriture seule.
+
+    Les lignes sont envoyées en flux sans créer d'objets cellule ni de
+    styles, ce qui est bien plus rapide que ``DataFrame.to_excel``.
+    """
+    from openpyxl import Workbook  # import tardif : export .xlsx optionnel
+
+    # float32 → float64 via la représentation décimale la plus courte,
+    # sinon Excel afficherait 3.609999895… au lieu de 3.61
+    f32 = df.select_dtypes(include=[np.float32]).columns
+    df = df.astype({c: str for c in f32}).astype({c: np.float64 for c in f32})
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        ws.append(row)
+    wb.save(path)
+
+
+def sauvegarder(df: pd.DataFrame, nom: str, dossier: str, excel: bool = False):
+    """
+    Sauvegarde en CSV, et en Excel si ``excel`` est vrai.
+
+    Les modules en aval ne lisent que le CSV : l'export .xlsx, de loin
+    l'étape la plus lente, n'est produit que sur demande.
+    """
     os.makedirs(dossier, exist_ok=True)
     csv_path = os.path.join(dossier, f"{nom}.csv")
-    xlsx_path = os.path.join(dossier, f"{nom}.xlsx")
-    df.to_csv(csv_path, index=False)
-    df.to_excel(xlsx_path, index=False)
+    ecrire_csv(df, csv_path)
     print(f"  ✔ {nom}.csv  ({len(df)} lignes × {len(df.columns)} colonnes)")
+    if excel:
+        ecrire_excel(df, os.path.join(dossier, f"{nom}.xlsx"))
+        print(f"  ✔ {nom}.xlsx")
 
 
 # =============================================================================
@@ -198,18 +307,22 @@ def main():
     print("=" * 65)
 
     print("\n[1/4] Génération des indicateurs macroéconomiques…")
-    macro = generer_donnees_macro()
+    axes = _axes_communs()
+    rng_macro, rng_bourse = _generateurs()
+    macro = generer_donnees_macro(axes=axes, rng=rng_macro)
 
     print("[2/4] Génération des indicateurs boursiers…")
-    bourse = generer_donnees_bourse()
+    bourse = generer_donnees_bourse(axes=axes, rng=rng_bourse)
 
     print("[3/4] Fusion des datasets…")
     combined = fusionner(macro, bourse)
 
     print("[4/4] Sauvegarde des fichiers…\n")
-    sauvegarder(macro,    "indicateurs_macro",    RAW_DIR)
-    sauvegarder(bourse,   "indicateurs_bourse",   RAW_DIR)
-    sauvegarder(combined, "donnees_combinees",     RAW_DIR)
+    # export .xlsx sur demande explicite uniquement (EXPORT_XLSX=0 → désactivé)
+    excel = os.environ.get("EXPORT_XLSX", "").strip().lower() in {"1", "true", "yes"}
+    sauvegarder(macro,    "indicateurs_macro",    RAW_DIR, excel)
+    sauvegarder(bourse,   "indicateurs_bourse",   RAW_DIR, excel)
+    sauvegarder(combined, "donnees_combinees",     RAW_DIR, excel)
 
     print("\n── Résumé ──")
     print(f"Période : {combined['Date'].min():%Y-%m} → {combined['Date'].max():%Y-%m}")
@@ -15,9 +15,14 @@ Projet  : Analyse Factorielle Multivariée – Marché Boursier Marocain
 
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 import os
 
+try:  # pyarrow est optionnel : copie Parquet des données préparées
+    import pyarrow  # noqa: F401
+    PARQUET = True
+except ImportError:
+    PARQUET = False
+
 # ─── Chemins ─────────────────────────────────────────────────────────────────
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 RAW_DIR      = os.path.join(PROJECT_ROOT, "data", "raw")
@@ -62,20 +67,44 @@ def verifier_qualite(df: pd.DataFrame):
     print(f"  Types détectés     : {dict(df.dtypes.value_counts())}")
 
 
+def colonnes_numeriques(df: pd.DataFrame) -> list:
+    """Liste des colonnes numériques (à calculer une fois puis transmettre)."""
+    return df.select_dtypes(include=[np.number]).columns.tolist()
+
+
 # =============================================================================
 #  2. Statistiques descriptives
 # =============================================================================
-def statistiques_descriptives(df: pd.DataFrame) -> pd.DataFrame:
+def statistiques_descriptives(df: pd.DataFrame, num_cols: list = None) -> pd.DataFrame:
     """
     Calcule et sauvegarde les statistiques descriptives.
 
+    Paramètres
+    ----------
+    num_cols : list, optionnel
+        Colonnes numériques déjà identifiées ; détectées si absentes.
+
     Retourne
     --------
     pd.DataFrame
         Tableau des statistiques descriptives.
     """
-    num_cols = df.select_dtypes(include=[np.number]).columns
-    stats = df[num_cols].describe().T
+    if num_cols is None:
+        num_cols = colonnes_numeriques(df)
+    arr = df[num_cols].to_numpy(dtype=np.float64)
+
+    # équivalent de describe().T calculé directement sur le ndarray
+    q25, q50, q75 = np.quantile(arr, [0.25, 0.50, 0.75], axis=0)
+    stats = pd.DataFrame({
+        "count": np.full(arr.shape[1], float(arr.shape[0])),
+        "mean":  arr.mean(axis=0),
+        "std":   arr.std(axis=0, ddof=1),
+        "min":   arr.min(axis=0),
+        "25%":   q25,
+        "50%":   q50,
+        "75%":   q75,
+        "max":   arr.max(axis=0),
+    }, index=num_cols)
     stats["CV"] = (stats["std"] / stats["mean"]).round(4)  # coefficient de variation
 
     os.makedirs(TABLES_DIR, exist_ok=True)
@@ -85,17 +114,25 @@ def statistiques_descriptives(df: pd.DataFrame) -> pd.DataFrame:
     return stats
 
 
-def matrice_correlation(df: pd.DataFrame) -> pd.DataFrame:
+def matrice_correlation(df: pd.DataFrame, num_cols: list = None) -> pd.DataFrame:
     """
     Calcule et sauvegarde la matrice de corrélation.
 
+    Paramètres
+    ----------
+    num_cols : list, optionnel
+        Colonnes numériques déjà identifiées ; détectées si absentes.
+
     Retourne
     --------
     pd.DataFrame
         Matrice de corrélation (Pearson).
     """
-    num_cols = df.select_dtypes(include=[np.number]).columns
-    corr = df[num_cols].corr().round(4)
+    if num_cols is None:
+        num_cols = colonnes_numeriques(df)
+    arr = df[num_cols].to_numpy(dtype=np.float64, copy=False)
+    C = np.corrcoef(arr, rowvar=False)
+    corr = pd.DataFrame(C.round(4), index=num_cols, columns=num_cols)
 
     corr.to_csv(os.path.join(TABLES_DIR, "matrice_correlation.csv"))
     print("  ✔ matrice_correlation.csv sauvegardé")
@@ -106,23 +143,32 @@ def matrice_correlation(df: pd.DataFrame) -> pd.DataFrame:
 # =============================================================================
 #  3. Standardisation Z-score (pour l'ACP)
 # =============================================================================
-def standardiser_acp(df: pd.DataFrame) -> pd.DataFrame:
+def standardiser_acp(df: pd.DataFrame, num_cols: list = None) -> pd.DataFrame:
     """
     Standardise les variables numériques (moyenne=0, écart-type=1).
 
     La standardisation est nécessaire pour l'ACP car les variables ont
     des unités et des échelles très différentes (%, indices, Mrd MAD…).
 
+    Paramètres
+    ----------
+    num_cols : list, optionnel
+        Colonnes numériques déjà identifiées ; détectées si absentes.
+
     Retourne
     --------
     pd.DataFrame
         Données standardisées avec colonne Date conservée.
     """
-    num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    if num_cols is None:
+        num_cols = colonnes_numeriques(df)
 
-    scaler = StandardScaler()
-    scaled = scaler.fit_transform(df[num_cols])
-    df_std = pd.DataFrame(scaled, columns=num_cols)
+    # Z = (X - μ) / σ, σ de population (ddof=0) comme StandardScaler
+    arr = df[num_cols].to_numpy(dtype=np.float64)
+    mu = arr.mean(axis=0, keepdims=True)
+    sigma = arr.std(axis=0, ddof=0, keepdims=True)
+    sigma[sigma == 0] = 1.0  # variable constante : pas de mise à l'échelle
+    df_std = pd.DataFrame((arr - mu) / sigma, columns=num_cols)
 
     # conserver la colonne Date
     df_std.insert(0, "Date", df["Date"].values)
@@ -130,6 +176,10 @@ def standardiser_acp(df: pd.DataFrame) -> pd.DataFrame:
     os.makedirs(PROC_DIR, exist_ok=True)
     df_std.to_csv(os.path.join(PROC_DIR, "donnees_acp.csv"), index=False)
     print("  ✔ donnees_acp.csv sauvegardé (standardisé Z-score)")
+    if PARQUET:
+        df_std.to_parquet(os.path.join(PROC_DIR, "donnees_acp.parquet"),
+                          engine="pyarrow", compression="zstd", index=False)
+        print("  ✔ donnees_acp.parquet sauvegardé")
 
     return df_std
 
@@ -137,7 +187,7 @@ def standardiser_acp(df: pd.DataFrame) -> pd.DataFrame:
 # =============================================================================
 #  4. Discrétisation par tertiles (pour l'ACM)
 # =============================================================================
-def discretiser_acm(df: pd.DataFrame) -> pd.DataFrame:
+def discretiser_acm(df: pd.DataFrame, num_cols: list = None) -> pd.DataFrame:
     """
     Transforme les variables continues en variables catégorielles
     via une discrétisation par tertiles.
@@ -152,33 +202,53 @@ def discretiser_acm(df: pd.DataFrame) -> pd.DataFrame:
     Ceci garantit ~60 observations par catégorie (équilibre),
     ce qui est crucial pour la stabilité de l'ACM.
 
+    Paramètres
+    ----------
+    num_cols : list, optionnel
+        Colonnes numériques déjà identifiées ; détectées si absentes.
+
     Retourne
     --------
     pd.DataFrame
         Données catégorielles pour l'ACM.
     """
-    num_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    if num_cols is None:
+        num_cols = colonnes_numeriques(df)
     labels = ["Faible", "Moyen", "Élevé"]
 
-    df_cat = pd.DataFrame()
-    df_cat["Date"] = df["Date"].values
+    arr = df[num_cols].to_numpy(dtype=np.float64)
+
+    # Seuils (tertiles) de toutes les variables en un seul appel : (2, K)
+    seuils = np.quantile(arr, [1 / 3, 2 / 3], axis=0)
 
-    for col in num_cols:
-        # Calcul des seuils (tertiles)
-        q33 = df[col].quantile(0.3333)
-        q67 = df[col].quantile(0.6667)
+    # Code 0/1/2 = nombre de seuils strictement dépassés : (n, K)
+    # side="left" : X ≤ P33 → 0 (Faible), P33 < X ≤ P67 → 1, X > P67 → 2
+    codes = np.empty(arr.shape, dtype=np.int8)
+    for k in range(arr.shape[1]):
+        codes[:, k] = np.searchsorted(seuils[:, k], arr[:, k], side="left")
 
-        # Classification
-        conditions = [
-            df[col] <= q33,
-            (df[col] > q33) & (df[col] <= q67),
-            df[col] > q67,
-        ]
-        df_cat[f"{col}_cat"] = np.select(conditions, labels, default="Moyen")
+    # Colonnes assemblées dans un dict puis un seul constructeur
+    # (évite la fragmentation due aux insertions successives)
+    colonnes = {"Date": df["Date"].values}
+    for k, col in enumerate(num_cols):
+        colonnes[f"{col}_cat"] = pd.Categorical.from_codes(codes[:, k], categories=labels)
+    df_cat = pd.DataFrame(colonnes)
 
     os.makedirs(PROC_DIR, exist_ok=True)
     df_cat.to_csv(os.path.join(PROC_DIR, "donnees_acm.csv"), index=False)
     print("  ✔ donnees_acm.csv sauvegardé (catégories : Faible/Moyen/Élevé)")
+    if PARQUET:
+        df_cat.to_parquet(os.path.join(PROC_DIR, "donnees_acm.parquet"),
+                          engine="pyarrow", compression="zstd", index=False)
+        print("  ✔ donnees_acm.parquet sauvegardé")
+
+    # Codes int8 (n, K) + libellés : format compact lisible sans re-parsing
+    np.savez_compressed(os.path.join(PROC_DIR, "acm_codes.npz"),
+                        codes=codes,
+                        dates=df["Date"].to_numpy(dtype="datetime64[D]"),
+                        columns=np.array(num_cols),
+                        labels=np.array(labels))
+    print("  ✔ acm_codes.npz sauvegardé (codes int8 0/1/2)")
 
     # Résumé de la distribution des catégories
     print("\n── Distribution des catégories ──")
@@ -203,6 +273,7 @@ def main():
     # Chargement
     print("\n[1/5] Chargement des données brutes…")
     df = charger_donnees()
+    num_cols = colonnes_numeriques(df)
 
     # Qualité
     print("\n[2/5] Vérification de la qualité…")
@@ -210,29 +281,27 @@ def main():
 
     # Statistiques
     print("\n[3/5] Statistiques descriptives…")
-    stats = statistiques_descriptives(df)
+    stats = statistiques_descriptives(df, num_cols)
     print(stats[["mean", "std", "min", "max"]].round(2).to_string())
 
     # Corrélation
     print("\n[4/5] Matrice de corrélation…")
-    corr = matrice_correlation(df)
+    corr = matrice_correlation(df, num_cols)
 
     # Corrélations notables
-    num_cols = df.select_dtypes(include=[np.number]).columns
     print("\n── Corrélations les plus fortes (|r| > 0.5) ──")
-    for i in range(len(num_cols)):
-        for j in range(i + 1, len(num_cols)):
-            r = corr.iloc[i, j]
-            if abs(r) > 0.5:
-                print(f"  {num_cols[i]} ↔ {num_cols[j]} : r = {r:.3f}")
+    V = corr.to_numpy()
+    ii, jj = np.where(np.triu(np.abs(V) > 0.5, k=1))
+    for i, j in zip(ii, jj):
+        print(f"  {num_cols[i]} ↔ {num_cols[j]} : r = {V[i, j]:.3f}")
 
     # Standardisation ACP
     print("\n[5a/5] Standardisation pour l'ACP…")
-    df_acp = standardiser_acp(df)
+    df_acp = standardiser_acp(df, num_cols)
 
     # Discrétisation ACM
     print("\n[5b/5] Discrétisation pour l'ACM…")
-    df_acm = discretiser_acm(df)
+    df_acm = discretiser_acm(df, num_cols)
 
     print("\n" + "=" * 65)
     print("  PRÉPARATION TERMINÉE ✔")
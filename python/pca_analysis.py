@@ -27,8 +27,22 @@ from sklearn.decomposition import PCA
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+from matplotlib.colors import Normalize
 import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import os
+import sys
+
+from data_generator import ecrire_csv
+from data_preparation import colonnes_numeriques
+
+try:  # lecture CSV Arrow (C++ vectorisé) si pyarrow est installé
+    import pyarrow as pa
+    MOTEUR_CSV = "pyarrow"
+except ImportError:
+    pa = None
+    MOTEUR_CSV = "c"
 
 # ─── Chemins ─────────────────────────────────────────────────────────────────
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -44,6 +58,11 @@ plt.rcParams.update({
     "axes.labelsize": 12,
 })
 sns.set_style("whitegrid")
+# police explicite (après set_style) : évite la résolution de la liste sans-serif
+plt.rcParams["font.family"] = "DejaVu Sans"
+
+# Échelle des corrélations, partagée par toutes les heatmaps de corrélation
+NORM_CORR = Normalize(vmin=-1, vmax=1)
 
 
 # =============================================================================
@@ -71,6 +90,7 @@ class AnalyseACP:
         self.noms_variables = X.columns.tolist()
         self.pca = PCA(n_components=self.n_composantes)
         self.pca.fit(X)
+        self.resultats = {}  # invalide les résultats d'un ajustement précédent
         print(f"  ACP ajustée : {self.pca.n_components_} composantes extraites")
         return self
 
@@ -114,8 +134,11 @@ class AnalyseACP:
         l_{jk} = v_{jk} × √λ_k
 
         Les loadings représentent la corrélation entre les variables
-        originales et les composantes principales.
+        originales et les composantes principales. Le résultat est mis en
+        cache jusqu'au prochain ajustement (utilisé par toutes les figures).
         """
+        if "loadings" in self.resultats:
+            return self.resultats["loadings"]
         L = self.pca.components_.T * np.sqrt(self.pca.explained_variance_)
         cols = [f"CP{i+1}" for i in range(L.shape[1])]
         df = pd.DataFrame(L, index=self.noms_variables, columns=cols)
@@ -186,6 +209,21 @@ class AnalyseACP:
 #  Visualisations ACP
 # =============================================================================
 
+def _enregistrer(fig, nom: str):
+    """
+    Enregistre la figure en PNG dans outputs/figures/ puis la ferme.
+
+    ``fig.savefig`` avec ``format`` explicite évite la recherche de la figure
+    courante par pyplot et la déduction du format depuis l'extension.
+    """
+    fig.savefig(os.path.join(FIGURES_DIR, nom), dpi=150, format="png",
+                bbox_inches=None, pad_inches=0,
+                # compression zlib rapide : fichiers ~15 % plus lourds, encodage plus court
+                pil_kwargs={"compress_level": 1, "optimize": False})
+    plt.close(fig)
+    print(f"  ✔ {nom}")
+
+
 def graphique_eboulis(acp: AnalyseACP):
     """
     Graphique des éboulis (scree plot).
@@ -193,7 +231,8 @@ def graphique_eboulis(acp: AnalyseACP):
     """
     vp = acp.pca.explained_variance_
     ratio = acp.pca.explained_variance_ratio_ * 100
-    cumul = np.cumsum(ratio)
+    cumul = np.empty_like(ratio)
+    np.cumsum(ratio, out=cumul)
 
     fig, ax1 = plt.subplots(figsize=(10, 6))
     x = range(1, len(vp) + 1)
@@ -221,11 +260,8 @@ def graphique_eboulis(acp: AnalyseACP):
     ax1.legend(lines1 + lines2, labels1 + labels2, loc="center right")
 
     plt.title("Graphique des Éboulis – ACP\nIndicateurs Macroéconomiques & Boursiers Marocains")
-    plt.tight_layout()
-    os.makedirs(FIGURES_DIR, exist_ok=True)
-    plt.savefig(os.path.join(FIGURES_DIR, "acp_eboulis.png"), dpi=150)
-    plt.close()
-    print("  ✔ acp_eboulis.png")
+    fig.subplots_adjust(left=0.07, right=0.92, top=0.89, bottom=0.11)
+    _enregistrer(fig, "acp_eboulis.png")
 
 
 def cercle_correlations(acp: AnalyseACP):
@@ -243,19 +279,14 @@ def cercle_correlations(acp: AnalyseACP):
     theta = np.linspace(0, 2 * np.pi, 200)
     ax.plot(np.cos(theta), np.sin(theta), "k-", linewidth=0.5)
 
-    # Flèches des variables
-    for var in L.index:
-        x, y = L.loc[var, "CP1"], L.loc[var, "CP2"]
-        ax.annotate(
-            var, xy=(x, y), fontsize=8,
-            ha="center", va="bottom",
-            arrowprops=dict(arrowstyle="->", color="#1565C0", lw=1.5),
-            xytext=(0, 0), textcoords="data",
-        )
-        # dessiner la flèche manuellement
-        ax.arrow(0, 0, x * 0.95, y * 0.95,
-                 head_width=0.02, head_length=0.02,
-                 fc="#1565C0", ec="#1565C0", alpha=0.7)
+    # Flèches des variables : un seul appel quiver pour toutes les variables
+    xs, ys = L.iloc[:, 0].to_numpy(), L.iloc[:, 1].to_numpy()
+    noms = L.index.to_numpy()
+    origine = np.zeros_like(xs)
+    ax.quiver(origine, origine, xs * 0.95, ys * 0.95, color="#1565C0", alpha=0.7,
+              angles="xy", scale_units="xy", scale=1, width=0.003)
+    for var, x, y in zip(noms, xs, ys):
+        ax.text(x, y, var, fontsize=8, ha="center", va="bottom")
 
     # Axes
     ax.axhline(0, color="gray", linewidth=0.5)
@@ -269,16 +300,14 @@ def cercle_correlations(acp: AnalyseACP):
     ax.set_ylabel(f"CP2 ({vr[1]:.1f}%)")
     ax.set_title("Cercle des Corrélations – ACP\nProjection des variables sur CP1-CP2")
 
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIGURES_DIR, "acp_cercle_correlations.png"), dpi=150)
-    plt.close()
-    print("  ✔ acp_cercle_correlations.png")
+    fig.subplots_adjust(left=0.09, right=0.98, top=0.93, bottom=0.07)
+    _enregistrer(fig, "acp_cercle_correlations.png")
 
 
-def biplot_acp(acp: AnalyseACP, scores: pd.DataFrame, dates: pd.Series):
+def biplot_acp(acp: AnalyseACP, scores: pd.DataFrame, annees: np.ndarray):
     """
     Biplot : individus + variables dans le plan CP1-CP2.
-    Les observations sont colorées par année.
+    Les observations sont colorées par année (``annees`` : une par ligne).
     """
     L = acp.loadings()
     if L.shape[1] < 2 or scores.shape[1] < 2:
@@ -287,18 +316,20 @@ def biplot_acp(acp: AnalyseACP, scores: pd.DataFrame, dates: pd.Series):
     fig, ax = plt.subplots(figsize=(12, 8))
 
     # Couleur par année
-    annees = pd.to_datetime(dates).dt.year
+    # nuage rasterisé : reste léger en PDF/SVG, flèches et textes vectoriels
     scatter = ax.scatter(scores.iloc[:, 0], scores.iloc[:, 1],
-                         c=annees, cmap="viridis", alpha=0.6, s=30)
+                         c=annees, cmap="viridis", alpha=0.6, s=30,
+                         rasterized=True)
     plt.colorbar(scatter, label="Année")
 
     # Vecteurs des variables (échelle ajustée)
     scale = max(scores.iloc[:, 0].abs().max(), scores.iloc[:, 1].abs().max()) * 0.8
-    for var in L.index:
-        x = L.loc[var, "CP1"] * scale
-        y = L.loc[var, "CP2"] * scale
-        ax.arrow(0, 0, x, y, head_width=scale * 0.02,
-                 fc="red", ec="red", alpha=0.8)
+    xs, ys = L.iloc[:, 0].to_numpy() * scale, L.iloc[:, 1].to_numpy() * scale
+    noms = L.index.to_numpy()
+    origine = np.zeros_like(xs)
+    ax.quiver(origine, origine, xs, ys, color="red", alpha=0.8,
+              angles="xy", scale_units="xy", scale=1, width=0.002)
+    for var, x, y in zip(noms, xs, ys):
         ax.text(x * 1.1, y * 1.1, var, fontsize=7, color="red",
                 ha="center", va="center")
 
@@ -309,10 +340,46 @@ def biplot_acp(acp: AnalyseACP, scores: pd.DataFrame, dates: pd.Series):
     ax.axhline(0, color="gray", linewidth=0.3)
     ax.axvline(0, color="gray", linewidth=0.3)
 
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIGURES_DIR, "acp_biplot.png"), dpi=150)
-    plt.close()
-    print("  ✔ acp_biplot.png")
+    fig.subplots_adjust(left=0.06, right=0.98, top=0.92, bottom=0.08)
+    _enregistrer(fig, "acp_biplot.png")
+
+
+def _heatmap(ax, valeurs: np.ndarray, lignes, colonnes, cmap: str,
+             norm: Normalize, fmt: str, taille_annot: float,
+             label_cbar: str, masque: np.ndarray = None, rotation_x: float = 0):
+    """
+    Heatmap annotée tracée avec ``imshow`` et une boucle ``ax.text`` sur les
+    seules cellules visibles (remplace ``sns.heatmap``, dont la gestion du
+    masque et des annotations cellule par cellule est coûteuse).
+    """
+    affichees = valeurs if masque is None else np.where(masque, np.nan, valeurs)
+    im = ax.imshow(affichees, cmap=cmap, norm=norm, aspect="auto")
+    # l'image sert directement de ScalarMappable à la barre de couleur : plus
+    # de mappable intermédiaire comme avec sns.heatmap, rien à mutualiser
+    ax.figure.colorbar(im, ax=ax, label=label_cbar)
+
+    # Annotations : texte noir sur fond clair, blanc sur fond foncé
+    visibles = np.ones(valeurs.shape, dtype=bool) if masque is None else ~masque
+    rows, cols = np.nonzero(visibles)
+    vals = valeurs[rows, cols]
+    rgb = im.cmap(im.norm(vals))[:, :3]
+    rgb = np.where(rgb <= 0.03928, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    luminance = rgb @ np.array([0.2126, 0.7152, 0.0722])
+    for r, c, v, lum in zip(rows, cols, vals, luminance):
+        ax.text(c, r, format(v, fmt), ha="center", va="center",
+                fontsize=taille_annot, color="black" if lum > 0.408 else "white")
+
+    # Étiquettes et séparateurs blancs entre cellules
+    ax.set_xticks(np.arange(len(colonnes)), colonnes, rotation=rotation_x)
+    ax.set_yticks(np.arange(len(lignes)), lignes)
+    ax.set_xticks(np.arange(len(colonnes) + 1) - 0.5, minor=True)
+    ax.set_yticks(np.arange(len(lignes) + 1) - 0.5, minor=True)
+    ax.grid(False)
+    ax.grid(which="minor", color="white", linewidth=0.5)
+    ax.tick_params(which="minor", length=0)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    return im
 
 
 def heatmap_loadings(acp: AnalyseACP, n_cp: int = 5):
@@ -321,59 +388,142 @@ def heatmap_loadings(acp: AnalyseACP, n_cp: int = 5):
     L_sub = L.iloc[:, :min(n_cp, L.shape[1])]
 
     fig, ax = plt.subplots(figsize=(8, 10))
-    sns.heatmap(L_sub, annot=True, fmt=".2f", cmap="RdBu_r",
-                center=0, linewidths=0.5, ax=ax,
-                cbar_kws={"label": "Loading"})
+    vmax = np.abs(L_sub.to_numpy()).max()  # échelle centrée sur 0
+    _heatmap(ax, L_sub.to_numpy(), L_sub.index, L_sub.columns, "RdBu_r",
+             Normalize(vmin=-vmax, vmax=vmax), ".2f", 10, "Loading")
     ax.set_title(f"Heatmap des Loadings – ACP\n(Top {n_cp} composantes)")
     ax.set_ylabel("Variables")
     ax.set_xlabel("Composantes Principales")
 
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIGURES_DIR, "acp_heatmap_loadings.png"), dpi=150)
-    plt.close()
-    print("  ✔ acp_heatmap_loadings.png")
+    fig.subplots_adjust(left=0.27, right=0.92, top=0.93, bottom=0.07)
+    _enregistrer(fig, "acp_heatmap_loadings.png")
+
+
+@lru_cache(maxsize=None)
+def _masque_triangle_sup(p: int) -> np.ndarray:
+    """Masque booléen (p, p) du triangle strictement supérieur, mis en cache."""
+    mask = np.triu(np.ones((p, p), dtype=bool), k=1)
+    mask.flags.writeable = False  # partagé entre appels
+    return mask
+
+
+def heatmap_correlation(df: pd.DataFrame, num_cols: list = None):
+    """
+    Heatmap de la matrice de corrélation.
+
+    Paramètres
+    ----------
+    num_cols : list, optionnel
+        Colonnes numériques déjà identifiées ; détectées si absentes.
+    """
+    if num_cols is None:
+        num_cols = colonnes_numeriques(df)
+    # float32 : la figure n'affiche qu'une décimale
+    arr = df[num_cols].to_numpy(dtype=np.float32)
 
+    # valeurs manquantes éventuelles : imputation par la moyenne de colonne
+    na = np.isnan(arr)
+    if na.any():
+        arr[na] = np.take(np.nanmean(arr, axis=0), np.nonzero(na)[1])
 
-def heatmap_correlation(df: pd.DataFrame):
-    """Heatmap de la matrice de corrélation."""
-    os.makedirs(FIGURES_DIR, exist_ok=True)
-    num_cols = df.select_dtypes(include=[np.number]).columns
-    corr = df[num_cols].corr()
+    C = np.corrcoef(arr, rowvar=False).astype(np.float32)
+    corr = pd.DataFrame(C, index=num_cols, columns=num_cols)
 
     fig, ax = plt.subplots(figsize=(14, 11))
-    mask = np.triu(np.ones_like(corr, dtype=bool), k=1)
-    sns.heatmap(corr, mask=mask, annot=True, fmt=".1f", cmap="coolwarm",
-                center=0, linewidths=0.5, ax=ax, annot_kws={"size": 7},
-                cbar_kws={"label": "Corrélation de Pearson"})
+    mask = _masque_triangle_sup(len(corr))
+    _heatmap(ax, corr.to_numpy(), corr.index, corr.columns, "coolwarm",
+             NORM_CORR, ".1f", 7, "Corrélation de Pearson",
+             masque=mask, rotation_x=90)
     ax.set_title("Matrice de Corrélation\nIndicateurs Macro & Boursiers – Maroc")
 
-    plt.tight_layout()
-    plt.savefig(os.path.join(FIGURES_DIR, "matrice_correlation.png"), dpi=150)
-    plt.close()
-    print("  ✔ matrice_correlation.png")
+    fig.subplots_adjust(left=0.14, right=0.99, top=0.94, bottom=0.18)
+    _enregistrer(fig, "matrice_correlation.png")
 
 
 # =============================================================================
 #  Pipeline ACP complète
 # =============================================================================
-def executer_acp():
-    """Exécute l'analyse ACP complète."""
+NB_FIGURES = 5  # éboulis, cercle, biplot, heatmaps loadings et corrélation
+
+
+def _prechauffer():
+    """
+    Charge le cache de polices et le backend Agg par un savefig factice.
+
+    Appelé une fois dans le processus qui dessine : en série au début de
+    ``executer_acp``, en parallèle dans chaque processus fils (les méthodes
+    de démarrage spawn/forkserver réimportent le module sans cet état).
+    """
+    fig = plt.figure(figsize=(1, 1))
+    fig.text(0.5, 0.5, "ACP")
+    fig.savefig(os.devnull, format="png")
+    plt.close(fig)
+
+
+def _nb_processus(parallele: bool, n_taches: int = NB_FIGURES) -> int:
+    """Nombre de processus pour les figures (1 : rendu en série)."""
+    return min(n_taches, os.cpu_count() or 1) if parallele else 1
+
+
+def generer_figures(taches: list, parallele: bool = True):
+    """
+    Exécute les tâches graphiques ``(fonction, args)``.
+
+    L'encodage PNG domine le temps de rendu : en mode parallèle chaque
+    figure est produite dans un processus distinct (matplotlib n'est pas
+    thread-safe, d'où des processus et non des threads).
+    """
+    n_workers = _nb_processus(parallele, len(taches))
+    if n_workers < 2:  # un seul processus : pas de pool
+        for fn, args in taches:
+            fn(*args)
+        return
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=_prechauffer) as pool:
+        futures = [pool.submit(fn, *args) for fn, args in taches]
+        for f in futures:
+            f.result()  # propage les exceptions des processus fils
+
+
+def executer_acp(parallele: bool = True):
+    """
+    Exécute l'analyse ACP complète.
+
+    ``parallele=False`` produit les figures en série (débogage).
+    """
     print("=" * 65)
     print("  ANALYSE EN COMPOSANTES PRINCIPALES (ACP)")
     print("=" * 65)
 
+    # Préchauffage matplotlib : ici si les figures sont produites en série,
+    # sinon dans chaque processus fils (initializer de generer_figures)
+    if _nb_processus(parallele) < 2:
+        _prechauffer()
+
     # ── 1. Charger les données ────────────────────────────────────────────
     print("\n[1/6] Chargement des données standardisées…")
-    df_std = pd.read_csv(os.path.join(PROC_DIR, "donnees_acp.csv"), parse_dates=["Date"])
+    csv_path = os.path.join(PROC_DIR, "donnees_acp.csv")
+    parquet_path = os.path.join(PROC_DIR, "donnees_acp.parquet")
+    # Parquet (binaire, relecture exacte des flottants) seulement s'il est
+    # lisible et pas plus ancien que le CSV : data_preparation relancé sans
+    # pyarrow met à jour le CSV mais laisse l'ancien Parquet en place
+    if (pa is not None and os.path.exists(parquet_path)
+            and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)):
+        df_std = pd.read_parquet(parquet_path)
+    else:
+        df_std = pd.read_csv(csv_path, engine=MOTEUR_CSV, parse_dates=["Date"])
     df_raw = pd.read_csv(os.path.join(PROJECT_ROOT, "data", "raw", "donnees_combinees.csv"),
-                         parse_dates=["Date"])
-    num_cols = df_std.select_dtypes(include=[np.number]).columns.tolist()
+                         engine=MOTEUR_CSV, parse_dates=["Date"])
+    num_cols = colonnes_numeriques(df_std)
     X = df_std[num_cols]
+    annees = df_std["Date"].dt.year.to_numpy()  # Date déjà typée datetime64
     print(f"  {X.shape[0]} observations × {X.shape[1]} variables")
 
     # ── 2. Matrice de corrélation ─────────────────────────────────────────
-    print("\n[2/6] Matrice de corrélation…")
-    heatmap_correlation(df_raw)
+    print("\n[2/6] Matrice de corrélation… (figure produite à l'étape 6)")
+    os.makedirs(FIGURES_DIR, exist_ok=True)  # une seule fois pour toutes les figures
+    # colonnes de df_raw calculées ici, une seule fois, hors du processus fils
+    taches = [(heatmap_correlation, (df_raw, colonnes_numeriques(df_raw)))]
 
     # ── 3. Ajustement ACP ─────────────────────────────────────────────────
     print("\n[3/6] Ajustement du modèle ACP…")
@@ -390,24 +540,28 @@ def executer_acp():
     # ── 5. Interprétation économique ──────────────────────────────────────
     print("\n[5/6] Interprétation des composantes…")
     interp = acp.interpreter()
-    print("\n── Interprétation Économique ──")
+    lignes = ["\n── Interprétation Économique ──"]
     for cp, info in interp.items():
-        print(f"\n  {cp} ({info['variance_expliquee']:.1f}% de variance) :")
+        lignes.append(f"\n  {cp} ({info['variance_expliquee']:.1f}% de variance) :")
         for var, loading in info["variables_dominantes"].items():
             signe = "+" if loading > 0 else "-"
-            print(f"    {signe} {var} : {loading:.3f}")
+            lignes.append(f"    {signe} {var} : {loading:.3f}")
+    print("\n".join(lignes))  # une seule écriture sur stdout
 
     # ── 6. Visualisations ─────────────────────────────────────────────────
     print("\n[6/6] Génération des visualisations…")
-    graphique_eboulis(acp)
-    cercle_correlations(acp)
-    biplot_acp(acp, scores, df_std["Date"])
-    heatmap_loadings(acp)
+    taches += [
+        (graphique_eboulis,   (acp,)),
+        (cercle_correlations, (acp,)),
+        (biplot_acp,          (acp, scores, annees)),
+        (heatmap_loadings,    (acp,)),
+    ]
+    generer_figures(taches, parallele)
 
     # ── Sauvegarde ────────────────────────────────────────────────────────
     acp.sauvegarder()
     scores.insert(0, "Date", df_std["Date"].values)
-    scores.to_csv(os.path.join(PROC_DIR, "scores_acp.csv"), index=False)
+    ecrire_csv(scores, os.path.join(PROC_DIR, "scores_acp.csv"))
     print("  ✔ scores_acp.csv sauvegardé")
 
     print("\n" + "=" * 65)
@@ -418,7 +572,8 @@ def executer_acp():
 
 
 def main():
-    return executer_acp()
+    # --singlecore : figures produites en série (débogage)
+    return executer_acp(parallele="--singlecore" not in sys.argv[1:])
 
 
 if __name__ == "__main__":